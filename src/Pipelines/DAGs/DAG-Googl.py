@@ -150,7 +150,7 @@ with DAG(
         }
     )
     
-    # Tarea 9: Actualizar la tabla con nuevas columnas 'category', 'misc_content' y 'atributo'
+    # Tarea 9: Actualizar la tabla con nuevas columnas 'categoria_atributo', 'misc_content' y 'atributo'
     actualizar_misc_task = PythonOperator(
         task_id='actualizar_misc_con_atributos',
         python_callable=actualizar_misc_con_atributos,
@@ -0,0 +1,29 @@
+from functools import lru_cache
+from google.cloud import bigquery
+from google.cloud import storage
+
+
+@lru_cache(maxsize=None)
+def obtener_cliente_bigquery(project_id: str = None) -> bigquery.Client:
+    """
+    Devuelve un cliente de BigQuery reutilizado dentro del proceso para el proyecto indicado,
+    evitando repetir la búsqueda de credenciales y la creación del pool de conexiones.
+
+    Args:
+        project_id (str): ID del proyecto de GCP. Si es None se usa el proyecto de las credenciales.
+
+    Returns:
+        bigquery.Client: Cliente de BigQuery compartido.
+    """
+    return bigquery.Client(project=project_id)
+
+
+@lru_cache(maxsize=None)
+def obtener_cliente_storage() -> storage.Client:
+    """
+    Devuelve un cliente de Google Cloud Storage reutilizado dentro del proceso.
+
+    Returns:
+        storage.Client: Cliente de Cloud Storage compartido.
+    """
+    return storage.Client()
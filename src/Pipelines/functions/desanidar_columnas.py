@@ -1,10 +1,47 @@
-from google.cloud import bigquery, storage
-from io import StringIO
+from google.cloud import bigquery
+from google.api_core.exceptions import GoogleAPICallError
+from functions.clientes_gcp import obtener_cliente_bigquery, obtener_cliente_storage
 import pandas as pd
 import logging
 
-# Configuración básica del logging
+# Configuración del logger
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+################################################################################################
+def leer_json_gcs(bucket_name: str, archivo: str, columnas: list, tamano_bloque: int = 100_000) -> pd.DataFrame:
+    """
+    Lee por bloques un archivo JSON (un registro por línea) desde Google Cloud Storage,
+    conservando solo las columnas indicadas para no mantener el archivo completo en memoria.
+
+    Args:
+    -------
+    bucket_name : str
+        Nombre del bucket en Google Cloud Storage.
+    archivo : str
+        Nombre del archivo JSON a leer.
+    columnas : list
+        Columnas a conservar de cada bloque.
+    tamano_bloque : int
+        Cantidad de registros leídos por bloque.
+
+    Returns:
+    -------
+    pd.DataFrame
+        DataFrame con las columnas seleccionadas de todos los registros del archivo.
+    """
+    blob = obtener_cliente_storage().bucket(bucket_name).blob(archivo)
+
+    # Lee el archivo como flujo, sin descargarlo completo como texto
+    with blob.open("rb") as archivo_gcs:
+        bloques = [
+            bloque.reindex(columns=columnas)
+            for bloque in pd.read_json(archivo_gcs, lines=True, chunksize=tamano_bloque)
+        ]
+
+    if not bloques:
+        return pd.DataFrame(columns=columnas)
+    return pd.concat(bloques, ignore_index=True)
 
 ################################################################################################
 def desanidar_columna(bucket_name: str, archivo: str, project_id: str, dataset: str, columna: str, tabla_destino: str) -> None:
@@ -28,19 +65,14 @@ def desanidar_columna(bucket_name: str, archivo: str, project_id: str, dataset:
         Nombre de la tabla en BigQuery donde se guardarán los datos desanidados.
     """
     
-    # Inicializa los clientes de BigQuery y Cloud Storage
-    client = bigquery.Client()
-    storage_client = storage.Client()
+    # Inicializa el cliente de BigQuery
+    client = obtener_cliente_bigquery()
 
     # Define el ID de la tabla de destino
     table_id = f"{project_id}.{dataset}.{tabla_destino}"
 
-    # Lee el archivo JSON desde Cloud Storage
-    blob = storage_client.bucket(bucket_name).blob(archivo)
-    contenido = blob.download_as_text()
-
-    # Carga el archivo JSON en un DataFrame de Pandas
-    df = pd.read_json(contenido, lines=True)
+    # Lee desde Cloud Storage solo las columnas necesarias del archivo JSON
+    df = leer_json_gcs(bucket_name, archivo, ['gmap_id', columna])
 
     # Filtra registros sin información en la columna seleccionada o en 'gmap_id'
     df = df[df[columna].notna() & df['gmap_id'].notna()]
@@ -57,7 +89,7 @@ def desanidar_columna(bucket_name: str, archivo: str, project_id: str, dataset:
         job_config = bigquery.LoadJobConfig(write_disposition="WRITE_APPEND")
 
     client.load_table_from_dataframe(df_expanded[['gmap_id', columna]], table_id, job_config=job_config).result()
-    logging.info(f"Datos del archivo {archivo} cargados exitosamente en la tabla {tabla_destino} de BigQuery.")
+    logger.info(f"Datos del archivo {archivo} cargados exitosamente en la tabla {tabla_destino} de BigQuery.")
 
 #########################################################################################################
 
@@ -78,33 +110,44 @@ def seleccionar_columnas(bucket_name: str, archivo: str, project_id: str, datase
         Nombre del dataset en BigQuery donde se encuentra la tabla 'miscelaneos'.
     """
 
-    # Inicializa los clientes de BigQuery y Cloud Storage
-    client = bigquery.Client()
-    storage_client = storage.Client()
+    # Inicializa el cliente de BigQuery
+    client = obtener_cliente_bigquery()
 
-    # Define el ID de la tabla de destino
+    # Define el ID de la tabla de destino y de la tabla temporal de carga
     table_id = f"{project_id}.{dataset}.g_sitios"
+    temp_table_id = f"{project_id}.{dataset}.temp_g_sitios"
+
+    # Carga el archivo JSON de Cloud Storage en la tabla temporal con un load job (sin costo),
+    # conservando solo las columnas necesarias; BigQuery parsea el JSON sin descargarlo ni pasar por Pandas
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        ignore_unknown_values=True,
+        schema=[
+            bigquery.SchemaField("gmap_id", "STRING"),
+            bigquery.SchemaField("name", "STRING"),
+            bigquery.SchemaField("description", "STRING"),
+            bigquery.SchemaField("url", "STRING"),
+            bigquery.SchemaField("avg_rating", "FLOAT64"),
+            bigquery.SchemaField("num_of_reviews", "INT64"),
+        ],
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+    )
+    client.load_table_from_uri(f"gs://{bucket_name}/{archivo}", temp_table_id, job_config=job_config).result()
 
-    # Lee el archivo JSON desde Cloud Storage
-    blob = storage_client.bucket(bucket_name).blob(archivo)
-    contenido = blob.download_as_text()
-
-    # Carga el archivo JSON en un DataFrame de Pandas
-    df = pd.read_json(contenido, lines=True)
-
-    # Filtra registros sin información en 'MISC' o 'gmap_id'
-    df = df[df['name'].notna() & df['gmap_id'].notna()]
-
-    # Selecciona solo las columnas necesarias sin explotar/desanidar
-    df_selected = df[['gmap_id', 'name', 'description', 'url', 'avg_rating', 'num_of_reviews']]
-
-    # Configura la carga en BigQuery, utilizando "WRITE_APPEND" si la tabla ya contiene datos
-    table = client.get_table(table_id)
-    job_config = bigquery.LoadJobConfig(write_disposition="WRITE_APPEND" if table.num_rows > 0 else "WRITE_TRUNCATE")
+    # Filtra registros sin información en 'name' o 'gmap_id' y los añade a la tabla destino
+    insert_query = f"""
+    INSERT INTO `{table_id}` (gmap_id, name, description, url, avg_rating, num_of_reviews)
+    SELECT gmap_id, name, description, url, avg_rating, num_of_reviews
+    FROM `{temp_table_id}`
+    WHERE name IS NOT NULL AND gmap_id IS NOT NULL
+    """
+    try:
+        client.query(insert_query).result()
+    finally:
+        # Elimina la tabla temporal de carga
+        client.delete_table(temp_table_id, not_found_ok=True)
 
-    # Carga los datos en BigQuery
-    client.load_table_from_dataframe(df_selected, table_id, job_config=job_config).result()
-    print(f"Datos del archivo {archivo} cargados exitosamente en BigQuery.")
+    logger.info(f"Datos del archivo {archivo} cargados exitosamente en BigQuery.")
     
 ####################################################################################################################
     
@@ -125,36 +168,31 @@ def desanidar_horarios(bucket_name: str, archivo: str, project_id: str, dataset:
         Nombre del dataset en BigQuery donde se guardará la tabla 'horarios'.
     """
     
-    # Inicializa el cliente de BigQuery y el cliente de Cloud Storage
-    client = bigquery.Client()
-    storage_client = storage.Client()
+    # Inicializa el cliente de BigQuery
+    client = obtener_cliente_bigquery()
 
     # Define el ID de la tabla de destino
     table_id = f"{project_id}.{dataset}.g_horarios"
 
-    # Lee el archivo JSON desde Cloud Storage
-    blob = storage_client.bucket(bucket_name).blob(archivo)
-    contenido = blob.download_as_text()
-
-    # Carga el archivo JSON en un DataFrame de Pandas
-    df = pd.read_json(contenido, lines=True)
+    # Lee desde Cloud Storage solo las columnas necesarias del archivo JSON
+    df = leer_json_gcs(bucket_name, archivo, ['gmap_id', 'hours'])
 
     # Filtra registros sin información en 'hours' o 'gmap_id'
     df = df[df['hours'].notna() & df['gmap_id'].notna()]
 
-    # Función interna para extraer horarios de cada día
-    def retornar_horario(campo: list, dia: str) -> str:
-        try:
-            for i in range(len(campo)):
-                if campo[i][0].lower() == dia.lower():
-                    return campo[i][1]
-            return 'No Disponible'
-        except IndexError:
-            return 'No Disponible'
-
-    # Desanida horarios para cada día de la semana
+    # Función interna que indexa los horarios de un registro por día (en minúsculas),
+    # conservando la primera aparición de cada día y descartando entradas incompletas
+    def indexar_horarios(campo: list) -> dict:
+        horarios = {}
+        for entrada in campo:
+            if len(entrada) >= 2:
+                horarios.setdefault(entrada[0].lower(), entrada[1])
+        return horarios
+
+    # Recorre 'hours' una sola vez y resuelve cada día de la semana con una búsqueda en el diccionario
+    horarios = df['hours'].map(indexar_horarios)
     for dia in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
-        df[dia] = df['hours'].apply(lambda x: retornar_horario(x, dia=dia.capitalize()))
+        df[dia] = horarios.map(lambda h: h.get(dia, 'No Disponible'))
 
     # Selecciona las columnas necesarias
     df_expanded = df[['gmap_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']]
@@ -168,7 +206,7 @@ def desanidar_horarios(bucket_name: str, archivo: str, project_id: str, dataset:
 
     # Carga el DataFrame resultante a BigQuery
     client.load_table_from_dataframe(df_expanded, table_id, job_config=job_config).result()
-    logging.info(f"Datos del archivo {archivo} cargados exitosamente en la tabla 'horarios' de BigQuery.")  
+    logger.info(f"Datos del archivo {archivo} cargados exitosamente en la tabla 'horarios' de BigQuery.")  
     
 #####################################################################################################################
 
@@ -177,25 +215,18 @@ def desanidar_address(bucket_name: str, archivo: str, project_id: str, dataset:
     Toma un archivo JSON de Google Cloud Storage, extrae las direcciones y las separa en columnas adicionales.
     Luego, guarda los registros desanidados en BigQuery, descartando registros donde 'address' o 'gmap_id' son nulos.
     """
-    # Inicializa el cliente de BigQuery y el cliente de Cloud Storage
-    client = bigquery.Client(project=project_id)
-    storage_client = storage.Client()
+    # Inicializa el cliente de BigQuery
+    client = obtener_cliente_bigquery(project_id)
 
     # Define el ID de la tabla de destino
     table_id = f"{project_id}.{dataset}.g_address"
 
-    # Lee el archivo JSON desde Cloud Storage
-    blob = storage_client.bucket(bucket_name).blob(archivo)
-    contenido = blob.download_as_text()
-    # Usa StringIO para pasar el contenido como un archivo
-    contenido_io = StringIO(contenido)
-
-    # Carga el archivo JSON en un DataFrame de Pandas
+    # Lee desde Cloud Storage solo las columnas necesarias del archivo JSON
     try:
-        df = pd.read_json(contenido_io, lines=True)
-        logging.info(f"Archivo {archivo} cargado exitosamente en un DataFrame.")
-    except ValueError as e:
-        logging.error(f"Error al cargar el archivo {archivo} en un DataFrame: {e}")
+        df = leer_json_gcs(bucket_name, archivo, ['gmap_id', 'latitude', 'longitude', 'address'])
+        logger.info(f"Archivo {archivo} cargado exitosamente en un DataFrame.")
+    except ValueError:
+        logger.exception(f"Error al cargar el archivo {archivo} en un DataFrame.")
         raise  # Re-lanzar la excepción para que el flujo falle correctamente
 
     # Filtra registros sin información en 'address' o 'gmap_id'
@@ -246,7 +277,6 @@ def desanidar_address(bucket_name: str, archivo: str, project_id: str, dataset:
 
     # Agregamos un identificador único a cada estado
     df['id_estado'] = df['estado'].factorize()[0] + 1
-    print(df.columns)
     # Selecciona las columnas necesarias
     df_expanded = df[['gmap_id', 'address', 'latitude', 'longitude', 'direccion', 'ciudad', 'cod_postal', 'estado', 'id_estado']]
 
@@ -255,9 +285,9 @@ def desanidar_address(bucket_name: str, archivo: str, project_id: str, dataset:
     try:
         load_job = client.load_table_from_dataframe(df_expanded, table_id, job_config=job_config)
         load_job.result()  # Espera a que la carga termine
-        logging.info(f"Datos cargados exitosamente a {table_id}.")
-    except Exception as e:
-        logging.error(f"Error al cargar los datos a BigQuery: {e}")
+        logger.info(f"Datos cargados exitosamente a {table_id}.")
+    except GoogleAPICallError:
+        logger.exception(f"Error al cargar los datos a BigQuery en {table_id}.")
         raise  # Re-lanzar la excepción para que el flujo falle correctamente  
     
 
@@ -297,19 +327,14 @@ def desanidar_misc(bucket_name: str, archivo: str, project_id: str, dataset: str
         Nombre del dataset en BigQuery donde se encuentra la tabla 'miscelaneos'.
     """
     
-    # Inicializa el cliente de BigQuery y el cliente de Cloud Storage
-    client = bigquery.Client()
-    storage_client = storage.Client()
+    # Inicializa el cliente de BigQuery
+    client = obtener_cliente_bigquery()
 
     # Define el ID de la tabla de destino
     table_id = f"{project_id}.{dataset}.miscelaneos"
 
-    # Lee el archivo JSON desde Cloud Storage
-    blob = storage_client.bucket(bucket_name).blob(archivo)
-    contenido = blob.download_as_text()
-
-    # Carga el archivo JSON en un DataFrame de Pandas
-    df = pd.read_json(contenido, lines=True)
+    # Lee desde Cloud Storage solo las columnas necesarias del archivo JSON
+    df = leer_json_gcs(bucket_name, archivo, ['gmap_id', 'MISC'])
 
     # Filtra registros sin información en 'MISC' o 'gmap_id'
     df = df[df['MISC'].notna() & df['gmap_id'].notna()]
@@ -326,7 +351,7 @@ def desanidar_misc(bucket_name: str, archivo: str, project_id: str, dataset: str
         job_config = bigquery.LoadJobConfig(write_disposition="WRITE_APPEND")
 
     client.load_table_from_dataframe(df_expanded[['gmap_id', 'misc']], table_id, job_config=job_config).result()
-    print(f"Datos del archivo {archivo} cargados exitosamente en BigQuery.")
+    logger.info(f"Datos del archivo {archivo} cargados exitosamente en BigQuery.")
 
 ###########################################################################################
 
@@ -335,7 +360,7 @@ from google.cloud import bigquery
 def actualizar_misc_con_atributos(project_id: str, dataset: str) -> None:
     """
     Actualiza la tabla 'misceláneos' en BigQuery, creando una nueva tabla temporal que agrega
-    las columnas 'category' y 'atributo' a partir de la columna 'MISC'.
+    las columnas 'categoria_atributo' y 'atributo' a partir de la columna 'MISC'.
 
     Args:
     -------
@@ -344,7 +369,7 @@ def actualizar_misc_con_atributos(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery donde se encuentra la tabla 'miscelaneos'.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     table_id = f"{project_id}.{dataset}.miscelaneos"
     temp_table_id = f"{project_id}.{dataset}.temp_miscelaneos"
 
@@ -380,7 +405,8 @@ def actualizar_misc_con_atributos(project_id: str, dataset: str) -> None:
         FROM exploded,
         UNNEST(SPLIT(atributo_raw, ',')) AS element
     )
-    SELECT gmap_id, category, atributo
+    -- Se usan los mismos nombres de columna que la tabla oficial 'g_misc'
+    SELECT gmap_id, category AS categoria_atributo, atributo
     FROM final_exploded
     """
 
@@ -388,7 +414,7 @@ def actualizar_misc_con_atributos(project_id: str, dataset: str) -> None:
     extract_query_job = client.query(query)
     extract_query_job.result()  # Espera a que termine la consulta
 
-    print(f"Tabla temporal '{temp_table_id}' creada con éxito.")
+    logger.info(f"Tabla temporal '{temp_table_id}' creada con éxito.")
 
 ##################################################################################
 
@@ -406,20 +432,20 @@ def eliminar_categorias_especificas(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery donde se encuentra la tabla temporal.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     temp_table_id = f"{project_id}.{dataset}.temp_miscelaneos"
     
     # Consulta SQL para eliminar las filas con las categorías específicas
     delete_query = f"""
     DELETE FROM `{temp_table_id}`
-    WHERE category IN ('Health & safety')
+    WHERE categoria_atributo IN ('Health & safety')
     """
     
     # Ejecuta la consulta de eliminación
     delete_query_job = client.query(delete_query)
     delete_query_job.result()  # Espera a que se complete la eliminación
     
-    print("Filas eliminadas con éxito.")
+    logger.info("Filas eliminadas con éxito.")
     
 ##################################################################################
 
@@ -434,7 +460,7 @@ def generalizar_atributos(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery donde se encuentra la tabla temporal.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     temp_table_id = f"{project_id}.{dataset}.temp_miscelaneos"
     
     # Definir el mapeo para generalizar atributos
@@ -450,31 +476,28 @@ def generalizar_atributos(project_id: str, dataset: str) -> None:
         'Wheelchair accessible lift': 'Wheelchair accessible elevator'
     }
     
-    # Para cada clave en los mapeos, se genera una consulta de UPDATE
-    for old_value, new_value in mapeo_lgbtq.items():
-        update_query = f"""
-        UPDATE `{temp_table_id}`
-        SET atributo = '{new_value}'
-        WHERE atributo = '{old_value}'
-        """
-        client.query(update_query).result()  # Ejecuta la consulta de actualización
-
-    for old_value, new_value in mapeo_accesibilidad.items():
-        update_query = f"""
-        UPDATE `{temp_table_id}`
-        SET atributo = '{new_value}'
-        WHERE atributo = '{old_value}'
-        """
-        client.query(update_query).result()  # Ejecuta la consulta de actualización
-
-    print("Atributos generalizados con éxito.")
+    # Une ambos mapeos en una sola consulta de UPDATE en lugar de un job por valor
+    mapeo = {**mapeo_lgbtq, **mapeo_accesibilidad}
+    casos = "\n".join(f"WHEN '{old_value}' THEN '{new_value}'" for old_value, new_value in mapeo.items())
+    valores = ", ".join(f"'{old_value}'" for old_value in mapeo)
+
+    update_query = f"""
+    UPDATE `{temp_table_id}`
+    SET atributo = CASE atributo
+        {casos}
+    END
+    WHERE atributo IN ({valores})
+    """
+    client.query(update_query).result()  # Ejecuta la consulta de actualización
+
+    logger.info("Atributos generalizados con éxito.")
 
 
 ###################################################################################
 
 def marcar_nuevas_accesibilidades(project_id: str, dataset: str) -> None:
     """
-    Actualiza la columna 'category' en la tabla de BigQuery para marcar ciertos 
+    Actualiza la columna 'categoria_atributo' en la tabla de BigQuery para marcar ciertos 
     valores de 'atributo' con la categoría 'Accessibility'.
     
     Args:
@@ -484,25 +507,25 @@ def marcar_nuevas_accesibilidades(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery donde se encuentra la tabla temporal.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     temp_table_id = f"{project_id}.{dataset}.temp_miscelaneos"
     
     # Consulta para actualizar la categoría a 'Accessibility' basado en las condiciones
     update_categoria_query = f"""
     UPDATE `{temp_table_id}`
-    SET category = CASE
-        WHEN category = 'Offerings' AND atributo = 'Braille menu' THEN 'Accessibility'
-        WHEN category = 'Amenities' AND atributo = 'High chairs' THEN 'Accessibility'
-        ELSE category
+    SET categoria_atributo = CASE
+        WHEN categoria_atributo = 'Offerings' AND atributo = 'Braille menu' THEN 'Accessibility'
+        WHEN categoria_atributo = 'Amenities' AND atributo = 'High chairs' THEN 'Accessibility'
+        ELSE categoria_atributo
     END
-    WHERE (category = 'Offerings' AND atributo = 'Braille menu')
-       OR (category = 'Amenities' AND atributo = 'High chairs')
+    WHERE (categoria_atributo = 'Offerings' AND atributo = 'Braille menu')
+       OR (categoria_atributo = 'Amenities' AND atributo = 'High chairs')
     """
     
     # Ejecutar la consulta de actualización
     client.query(update_categoria_query).result()
     
-    print("Categorías de accesibilidad actualizadas con éxito.")
+    logger.info("Categorías de accesibilidad actualizadas con éxito.")
 
 #########################################################################################
 
@@ -518,21 +541,16 @@ def mover_a_tabla_oficial(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery donde se encuentran las tablas.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     temp_table_id = f"{project_id}.{dataset}.temp_miscelaneos"
     official_table_id = f"{project_id}.{dataset}.g_misc"
     
-    # Consulta SQL para insertar los registros desde la tabla temporal a la tabla oficial
-    insert_query = f"""
-    INSERT INTO `{official_table_id}` (gmap_id, categoria_atributo, atributo)
-    SELECT gmap_id, category, atributo
-    FROM `{temp_table_id}`
-    """
-    
-    # Ejecutar la consulta
-    insert_query_job = client.query(insert_query)
-    insert_query_job.result()  # Espera a que se complete la inserción
+    # Copia los registros de la tabla temporal a la tabla oficial (ambas comparten esquema),
+    # lo que evita reescribir las filas con una consulta INSERT ... SELECT
+    job_config = bigquery.CopyJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+    copy_job = client.copy_table(temp_table_id, official_table_id, job_config=job_config)
+    copy_job.result()  # Espera a que se complete la copia
     
-    print("Datos movidos a la tabla oficial con éxito.")
+    logger.info("Datos movidos a la tabla oficial con éxito.")
     
 #############################################################################################
@@ -2,8 +2,8 @@ import requests
 import json
 import re
 from datetime import datetime
-from google.cloud import storage
 from google.cloud import bigquery
+from functions.clientes_gcp import obtener_cliente_bigquery, obtener_cliente_storage
 import logging
 
 # Configuración del logger
@@ -73,7 +73,7 @@ def extraer_reviews_google_places(api_key, businesses, bucket_name, output_file)
     #json_data = json.dumps(all_reviews, indent=4)
     
     # Subir el archivo JSON a Google Cloud Storage
-    client = storage.Client()
+    client = obtener_cliente_storage()
     bucket = client.get_bucket(bucket_name)
     blob = bucket.blob(output_file)
     #blob.upload_from_string(json_data, content_type='application/json')
@@ -100,7 +100,7 @@ def cargar_a_bigquery(bucket_name, output_file, dataset_name, table_name):
         table_name (str): El nombre de la tabla en BigQuery donde se cargarán los datos.
      """
 
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     table_ref = client.dataset(dataset_name).table(table_name)
 
     job_config = bigquery.LoadJobConfig(
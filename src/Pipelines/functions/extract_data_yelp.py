@@ -1,6 +1,12 @@
 import pandas as pd
-from google.cloud import storage
+import pyarrow.json as paj
+from functions.clientes_gcp import obtener_cliente_storage
+from google.cloud.storage import Blob, transfer_manager
 import io
+from functools import partial
+from typing import Callable
+import os
+import tempfile
 import logging
 from functions.transform_data_yelp import aplicar_transformacion
 
@@ -8,6 +14,43 @@ from functions.transform_data_yelp import aplicar_transformacion
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tamaño a partir del cual un archivo se descarga en partes concurrentes
+UMBRAL_DESCARGA_POR_PARTES = 128 * 1024 * 1024
+TAMANO_PARTE_DESCARGA = 32 * 1024 * 1024
+
+# PyArrow rechaza registros JSON más grandes que el bloque de lectura (1 MiB por defecto);
+# en 'checkin.json' el campo 'date' de un negocio concentra todas sus visitas y puede superarlo
+leer_json_arrow = partial(paj.read_json, read_options=paj.ReadOptions(block_size=64 * 1024 * 1024))
+
+def leer_blob(blob: Blob, lector: Callable):
+    """
+    Descarga un archivo de Google Cloud Storage y lo parsea con la función lectora indicada.
+    Los archivos grandes se descargan en partes concurrentes a un archivo temporal, que se
+    parsea directamente desde disco para no copiarlo completo en memoria.
+
+    Args:
+        blob (Blob): Archivo de GCS con sus metadatos cargados (incluido el tamaño).
+        lector (Callable): Función que recibe una ruta o un objeto tipo archivo y devuelve los datos
+            parseados (p. ej. `pyarrow.json.read_json` o `pd.read_parquet`).
+
+    Returns:
+        El resultado de `lector` sobre el contenido del archivo.
+    """
+    if not blob.size or blob.size <= UMBRAL_DESCARGA_POR_PARTES:
+        return lector(io.BytesIO(blob.download_as_bytes()))
+
+    logger.info(f"Descargando '{blob.name}' ({blob.size} bytes) en partes concurrentes.")
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, os.path.basename(blob.name))
+        transfer_manager.download_chunks_concurrently(
+            blob, ruta,
+            chunk_size=TAMANO_PARTE_DESCARGA,
+            worker_type=transfer_manager.THREAD,
+            max_workers=8
+        )
+        return lector(ruta)
+
+
 def cargar_archivo_gcs_a_dataframe(bucket_name: str, file_path: str) -> pd.DataFrame:
     """
     Extrae un archivo desde Google Cloud Storage y lo convierte en un DataFrame.
@@ -20,30 +63,38 @@ def cargar_archivo_gcs_a_dataframe(bucket_name: str, file_path: str) -> pd.DataF
     Returns:
         pd.DataFrame: DataFrame con los datos extraídos y transformados del archivo.
     """
-    client = storage.Client()
-    bucket = client.get_bucket(bucket_name)
-    blob = bucket.blob(file_path)
+    client = obtener_cliente_storage()
+    blob = client.bucket(bucket_name).blob(file_path)
+    blob.reload()  # Obtiene los metadatos del archivo, incluido su tamaño
     
+    # Un archivo de cero bytes no se descarga ni se parsea
+    if not blob.size:
+        logger.warning(f"El archivo '{file_path}' está vacío. Se devuelve un DataFrame vacío.")
+        return pd.DataFrame()
+
     logger.info(f"Iniciando descarga del archivo '{file_path}' desde el bucket '{bucket_name}'.")
     
     # Descarga y procesamiento del archivo en función de su tipo
     if file_path.endswith('.json'):
-        data = blob.download_as_text()
-        df = pd.read_json(io.StringIO(data), lines=True)
+        # El parser JSON de PyArrow (multihilo, en C++) es más rápido que pd.read_json
+        df = leer_blob(blob, leer_json_arrow).to_pandas()
         logger.info(f"Archivo JSON '{file_path}' cargado exitosamente en un DataFrame.")
         
     elif file_path.endswith('.parquet'):
-        df = pd.read_parquet(io.BytesIO(blob.download_as_bytes()))
+        df = leer_blob(blob, pd.read_parquet)
         logger.info(f"Archivo Parquet '{file_path}' cargado exitosamente en un DataFrame.")
         
-    elif file_path.endswith('.pkl'):
-        df = pd.read_pickle(io.BytesIO(blob.download_as_bytes()))
-        logger.info(f"Archivo Pickle '{file_path}' cargado exitosamente en un DataFrame.")
-        
+    # Los archivos Pickle no se aceptan: deserializarlos puede ejecutar código arbitrario
+    # y deben convertirse a Parquet antes de subirse al bucket
     else:
         logger.error(f"Formato de archivo no soportado: {file_path}")
         raise ValueError(f"Formato de archivo no soportado: {file_path}")
 
+    # Un archivo sin registros (p. ej. solo espacios o saltos de línea) no se transforma
+    if len(df.columns) == 0 or len(df.index) == 0:
+        logger.warning(f"El archivo '{file_path}' no contiene registros. Se devuelve un DataFrame vacío.")
+        return pd.DataFrame()
+
     # Aplicación de la transformación específica si existe en el diccionario
     df = aplicar_transformacion(file_path, df)
     logger.info(f"Transformación específica aplicada al archivo '{file_path}'.")
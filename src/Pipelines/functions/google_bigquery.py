@@ -1,8 +1,15 @@
 from google.cloud import bigquery
-from google.cloud import storage
+from functions.clientes_gcp import obtener_cliente_bigquery, obtener_cliente_storage
 import pandas as pd
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Configuración del logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cantidad mínima de archivos del bucket que se verifican en cada consulta contra la tabla de control
+TAMANO_LOTE_CANDIDATOS = 10000
 
 ################################################################
 
@@ -17,7 +24,7 @@ def crear_tablas_bigquery(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
 
     # Diccionario con las definiciones de tablas: nombre de la tabla y consulta SQL de creación
     tablas = {
@@ -83,10 +90,13 @@ def crear_tablas_bigquery(project_id: str, dataset: str) -> None:
         """
     }
     
-    # Ejecuta la consulta de creación para cada tabla
-    for nombre_tabla, create_query in tablas.items():
-        client.query(create_query).result()
-        logging.info(f"Tabla '{nombre_tabla}' creada o ya existente.")
+    # Envía todas las consultas de creación a la vez; los jobs de BigQuery son asíncronos
+    jobs = {nombre_tabla: client.query(create_query) for nombre_tabla, create_query in tablas.items()}
+
+    # Espera a que cada job termine
+    for nombre_tabla, job in jobs.items():
+        job.result()
+        logger.info(f"Tabla '{nombre_tabla}' creada o ya existente.")
         
 ##############################################################################################
 
@@ -101,7 +111,7 @@ def eliminar_tablas_temporales(project_id: str, dataset: str) -> None:
     dataset : str
         Nombre del dataset en BigQuery.
     """
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
 
     # Lista de tablas temporales a eliminar
     tablas_temporales = [
@@ -109,11 +119,41 @@ def eliminar_tablas_temporales(project_id: str, dataset: str) -> None:
         f"{project_id}.{dataset}.miscelaneos"
     ]
     
-    # Bucle para eliminar cada tabla temporal
-    for table_id in tablas_temporales:
-        drop_query = f"DROP TABLE IF EXISTS `{table_id}`"
-        client.query(drop_query).result()
-        logging.info(f"Tabla '{table_id}' eliminada con éxito.")
+    # Envía todas las consultas de eliminación a la vez y luego espera a cada una
+    jobs = {table_id: client.query(f"DROP TABLE IF EXISTS `{table_id}`") for table_id in tablas_temporales}
+
+    for table_id, job in jobs.items():
+        job.result()
+        logger.info(f"Tabla '{table_id}' eliminada con éxito.")
+
+###################################################################################################
+
+def _primer_archivo_no_procesado(client: bigquery.Client, table_id: str, candidatos: list) -> str:
+    '''
+    Consulta en BigQuery cuál es el primer archivo de la lista de candidatos que no figura en la tabla de control.
+    El filtrado se hace del lado de BigQuery, sin traer todos los archivos procesados.
+    
+    Retorna:
+    --------
+    str
+        Nombre del primer candidato no procesado (respetando el orden de la lista) o None si todos fueron procesados.
+    '''
+    query = f"""
+    SELECT nombre
+    FROM UNNEST(@candidatos) AS nombre WITH OFFSET AS orden
+    WHERE NOT EXISTS (
+        SELECT 1 FROM `{table_id}` AS procesados
+        WHERE procesados.nombre_archivo = nombre
+    )
+    ORDER BY orden
+    LIMIT 1
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("candidatos", "STRING", candidatos)]
+    )
+    filas = list(client.query(query, job_config=job_config).result())
+
+    return filas[0].nombre if filas else None
 
 ###################################################################################################
 
@@ -126,19 +166,27 @@ def detectar_archivos_nuevos(bucket_name: str, prefix: str, project_id: str, dat
     str
         Nombre del primer archivo nuevo que no se ha procesado previamente o None si no hay archivos nuevos.
     '''
-    storage_client = storage.Client()
-    client = bigquery.Client()
+    storage_client = obtener_cliente_storage()
+    client = obtener_cliente_bigquery()
     table_id = f"{project_id}.{dataset}.archivos_procesados"
 
-    # Obtener archivos ya procesados
-    query = f"SELECT nombre_archivo FROM `{table_id}`"
-    archivos_procesados = {row.nombre_archivo for row in client.query(query)}
+    # Recorrer el listado del bucket por páginas, agrupando varias páginas en cada consulta a BigQuery
+    # y deteniéndose en el primer lote que tenga un archivo nuevo
+    blobs = storage_client.list_blobs(bucket_name, prefix=prefix, page_size=1000)
+    candidatos = []
+    for pagina in blobs.pages:
+        # Se descartan los objetos que representan carpetas (terminan en '/')
+        candidatos.extend(blob.name for blob in pagina if not blob.name.endswith('/'))
+        if len(candidatos) < TAMANO_LOTE_CANDIDATOS:
+            continue
 
-    # Listar archivos en el bucket que aún no han sido procesados
-    blobs = storage_client.list_blobs(bucket_name, prefix=prefix)
-    archivos_nuevos = [blob.name for blob in blobs if blob.name not in archivos_procesados]
+        archivo_nuevo = _primer_archivo_no_procesado(client, table_id, candidatos)
+        if archivo_nuevo:
+            return archivo_nuevo
+        candidatos = []
 
-    return archivos_nuevos[0] if archivos_nuevos else None
+    # Consulta los candidatos restantes del último lote incompleto
+    return _primer_archivo_no_procesado(client, table_id, candidatos) if candidatos else None
 
 ###################################################################################################
 
@@ -151,13 +199,21 @@ def registrar_archivo_exitoso(archivo: str, project_id: str, dataset: str) -> No
     archivo : str
         Nombre del archivo procesado.
     '''
-    client = bigquery.Client()
+    client = obtener_cliente_bigquery()
     table_id = f"{project_id}.{dataset}.archivos_procesados"
 
+    # Fecha y hora actual en UTC, en formato compatible con BigQuery (TIMESTAMP o DATETIME)
+    fecha_carga = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')
     rows_to_insert = [{
         "nombre_archivo": archivo,
-        "fecha_carga": datetime.now().isoformat()
+        "fecha_carga": fecha_carga
         }
     ]
-    client.insert_rows_json(table_id, rows_to_insert)
-    print(f"Archivo registrado exitosamente: {archivo}")
\ No newline at end of file
+    # Carga por lote (load job) en lugar de inserción por streaming, usando el esquema de la tabla de control
+    # para que el cliente no active la autodetección de tipos (p. ej. TIMESTAMP vs DATETIME en 'fecha_carga')
+    job_config = bigquery.LoadJobConfig(
+        schema=client.get_table(table_id).schema,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+    )
+    client.load_table_from_json(rows_to_insert, table_id, job_config=job_config).result()
+    logger.info(f"Archivo registrado exitosamente: {archivo}")
\ No newline at end of file
@@ -1,8 +1,8 @@
 from google.cloud import bigquery
 import pandas as pd
 import logging
-from datetime import datetime
-from google.cloud import storage
+from datetime import datetime, timezone
+from functions.clientes_gcp import obtener_cliente_bigquery
 
 
 # Configuración del logger
@@ -19,18 +19,25 @@ def registrar_archivo_procesado(project_id: str, dataset: str, nombre_archivo: s
         dataset (str): Nombre del dataset en BigQuery.
         nombre_archivo (str): Nombre del archivo procesado.
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     table_id = f"{project_id}.{dataset}.archivos_procesados"
     
     logger.info(f"Registrando el archivo '{nombre_archivo}' en la tabla de control '{table_id}'.")
 
-    # Inserta la fecha y hora actual en formato compatible con BigQuery
+    # Inserta la fecha y hora actual en UTC, en formato compatible con BigQuery (TIMESTAMP o DATETIME)
+    fecha_carga = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')
     rows_to_insert = [{
         "nombre_archivo": nombre_archivo,
-        "fecha_carga": datetime.now().isoformat()  # Formato compatible con BigQuery
+        "fecha_carga": fecha_carga
     }]
     
-    client.insert_rows_json(table_id, rows_to_insert)
+    # Carga por lote (load job) en lugar de inserción por streaming, usando el esquema de la tabla de control
+    # para que el cliente no active la autodetección de tipos (p. ej. TIMESTAMP vs DATETIME en 'fecha_carga')
+    job_config = bigquery.LoadJobConfig(
+        schema=client.get_table(table_id).schema,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+    )
+    client.load_table_from_json(rows_to_insert, table_id, job_config=job_config).result()
     logger.info(f"Archivo '{nombre_archivo}' registrado exitosamente como procesado en la tabla de control.")
 
 
@@ -47,7 +54,7 @@ def archivo_procesado(project_id: str, dataset: str, nombre_archivo: str) -> boo
     Returns:
         bool: True si el archivo ya fue procesado, False en caso contrario.
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     table_id = f"{project_id}.{dataset}.archivos_procesados"
     logger.info(f"Verificando si el archivo '{nombre_archivo}' ya fue procesado en '{table_id}'.")
 
@@ -86,7 +93,7 @@ def crear_tabla_temporal(project_id: str, dataset: str, temp_table: str, schema:
     Returns:
         None
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     table_id = f"{project_id}.{dataset}.{temp_table}"
     table = bigquery.Table(table_id, schema=schema)
     
@@ -111,7 +118,7 @@ def cargar_dataframe_a_bigquery(df: pd.DataFrame, project_id: str, dataset: str,
         logger.warning("El DataFrame está vacío. No se cargarán datos en BigQuery.")
         return
 
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     table_id = f"{project_id}.{dataset}.{table_name}"
     
     logger.info(f"Iniciando carga de datos en la tabla '{table_id}'.")
@@ -132,7 +139,7 @@ def eliminar_tabla_temporal(project_id: str, dataset: str, table_name: str) -> N
     Returns:
         None
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     table_id = f"{project_id}.{dataset}.{table_name}"
     
     client.delete_table(table_id, not_found_ok=True)
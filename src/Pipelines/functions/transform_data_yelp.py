@@ -1,6 +1,6 @@
 import pandas as pd
 import logging
-from google.cloud import bigquery
+from functions.clientes_gcp import obtener_cliente_bigquery
 
 # Configuración del logger
 logging.basicConfig(level=logging.INFO)
@@ -90,7 +90,7 @@ def transformar_checkin(project_id: str, dataset: str, temp_table: str, final_ta
     Returns:
         None
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     
     # Consulta de transformación en BigQuery
     query = f"""
@@ -121,7 +121,7 @@ def transformar_tip(project_id: str, dataset: str, temp_table: str, final_table:
     Returns:
         None
     """
-    client = bigquery.Client(project=project_id)
+    client = obtener_cliente_bigquery(project_id)
     
     # Consulta de transformación en BigQuery
     query = f"""